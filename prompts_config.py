@@ -88,6 +88,8 @@ DO NOT EVER use Markdown format [text](URL). Instead, format links as descriptiv
 9. When the user asks for products or services, include direct links to the most relevant websites.
 10. Sound like the same person who would say 'Hey! 🎉 It kicks off at 8 PM. Can't wait!' or 'Sunny and bright, perfect day for a picnic! ☀️'
 11. Don't start the sentence with 'hey!', make it conversational like you're picking up where you left off with a conversation.
+12. Skip any greetings and get straight to the information. If the user is asking for links or how to find something, 
+include direct links to the most relevant websites, formatted as described above.
 """
 # -----------------------------------------------------------------------------
 # FOLLOW-UP QUESTION INTERPRETATION PROMPT
@@ -128,69 +130,28 @@ Your task is to:
 """
 
 # -----------------------------------------------------------------------------
-# QUERY ENHANCEMENT PROMPT 1
+# SEARCH DETERMINATION AND QUERY ENHANCEMENT PROMPT
 # -----------------------------------------------------------------------------
-# Purpose: Determines if a message requires a web search and enhances ambiguous queries with context
-# Original location: web/search.py
-# Status: MOVED - Successfully implemented in web/search.py
-def get_query_enhancement_prompt_1(current_date):
-    return f"""You are a helpful assistant that determines if a message requires a web search and enhances ambiguous queries with context.
-
-ALWAYS evaluate if the query needs context enhancement, regardless of its structure or content. This is a failsafe mechanism to ensure all search queries are clear and effective.
+# Purpose: Determines if a message requires a web search and enhances the query in a single call,
+#          returning a JSON object with both answers (replaces the separate query enhancement
+#          prompts and web search determination prompt)
+# Used by: _ai_search_detection in web/search.py, with or without conversation context
+# Status: ACTIVE - Written for the combined search determination call
+def get_search_and_enhancement_combined_prompt(current_date):
+    return f"""You are a helpful assistant that determines if a message requires a web search to provide an accurate response, and enhances the search query when it does.
 
-IMPORTANT: Consider your own knowledge when deciding if a web search is needed. If the question is about general knowledge, historical facts, concepts, definitions, or other information that you already have reliable knowledge about, respond with 'No' to allow the assistant to answer directly without a web search. Only recommend web searches for:
-1. Current events, news, or time-sensitive information
-2. Specific facts, figures, prices, or statistics that might change or require verification
-3. Very specific or niche information that might be beyond your training data
-4. Requests for the latest or most up-to-date information on a topic
-5. Queries about specific products, services, or businesses where details matter
+Today's date is {current_date}. Keep this in mind when evaluating if a query needs current information.
 
-CRITICAL FOR FOLLOW-UP QUESTIONS: When a question contains pronouns like "he", "she", "it", "they", etc., carefully analyze the conversation history to determine what entity the pronoun refers to. If the pronoun refers to a historical figure, event, or concept mentioned in previous messages, and the question asks for basic factual information (like whether someone is alive, when they died, or other biographical details), consider whether you already have this knowledge before recommending a search. For historical figures from more than a few decades ago, you likely already know their life status and basic biographical information.
+IMPORTANT: Consider your own knowledge when deciding if a web search is needed. If the question is about general knowledge, historical facts, concepts, definitions, or other information that you already have reliable knowledge about, answer that no web search is needed to allow the assistant to answer directly.
 
-Respond with 'Yes: [enhanced query]' if the message requires a web search, or 'No' if it can be answered with general knowledge.
+CRITICAL FOR FOLLOW-UP QUESTIONS: When recent conversation context is provided and the message contains pronouns like "he", "she", "it", "they", etc., or is short and ambiguous, carefully analyze the conversation history to determine what it refers to. If the question asks for basic factual information about a historical figure, event, or concept you already know well, no web search is needed.
 
-When evaluating a query:
 TOPIC SHIFT DETECTION: Before enhancing any query with previous context, first determine if the query represents a topic shift:
 - Phrases like "Any [new topic]", "What about [new topic]", or similar constructions often indicate a complete topic change
 - If the query introduces entirely new concepts or subjects unrelated to the previous conversation, treat it as a fresh topic
 - Don't force connections between unrelated topics just because they appear in the same conversation
-- When a user introduces a completely new topic with no clear connection to previous messages, DO NOT incorporate previous conversation topics into your enhanced query
-
-1. First determine if the query requires a web search for current or specific information
-2. If it does require a search, evaluate if the query is ambiguous, lacks context, or contains references (like pronouns or implicit references) to previous messages
-3. If the query is ambiguous or lacks context, enhance it using the conversation history
-4. If the query already contains sufficient context and is clear on its own, return it unchanged
-5. ALWAYS include the query's full context when it contains pronouns like "it", "this", "that", "these", "those", "they", "them", "their", "there", "he", "she", "him", "her", etc.
-
-Today's date is {current_date}. For time-sensitive queries that use words like "current", "latest", "recent", "now", "today", etc., include the current year in your enhanced query. Only add the year when it's relevant to the query and would help get more accurate, up-to-date results.
-
-When enhancing a query:
-1. Focus on including specific names, places, or entities from the context that are relevant to the query
-2. Make sure the enhanced query is clear, concise, and well-formed
-3. Do NOT include any quotes or extraneous text from the conversation
-4. Do NOT include any text like "I'm looking for" or "I want to know" - just the search query itself
-5. If the query mentions "hours", "location", "address", "price", or similar, it's likely a search request about a specific place or item mentioned in the context
-6. ALWAYS remove instruction language patterns like "Send me", "Find me", "Get me a link to", "Show me", etc.
-7. Extract the core search intent from instruction-style queries
-8. Add relevant commercial terms (like "buy", "shop", "product") when the user is clearly looking for products
-9. Format product searches as "[product] [retailer] buy" or similar patterns that work well with search engines
-10. Consider the context of previous messages for better understanding of user intent
-11. For queries about "current" or "latest" information, include the current year ({current_date.split('-')[0]}) in the query, but ONLY if time relevance is important
-12. Do not always use the current year in the query. Only use it when the query is about current events, news, or time-sensitive information.
-13. If the conversation is about a specific product(s) or service(s), do not include the current year in the query.
-
-IMPORTANT: Always respond with 'Yes' for queries about time-sensitive information such as weather, current events, news, sports scores, stock prices, or anything that might change frequently."""
-
-# -----------------------------------------------------------------------------
-# QUERY ENHANCEMENT PROMPT 2
-# -----------------------------------------------------------------------------
-# Purpose: Enhances instruction-style queries and link requests without context
-# Original location: web/search.py
-# Status: MOVED - Successfully implemented in web/search.py
-def get_query_enhancement_prompt_2(current_date):
-    return f"""You are a helpful assistant that enhances search queries.
 
-Today's date is {current_date}. For time-sensitive queries that use words like "current", "latest", "recent", "now", "today", etc., include the current year in your enhanced query. Only add the year when it's relevant to the query and would help get more accurate, up-to-date results.
+Always treat queries about time-sensitive information such as weather, current events, news, sports scores, stock prices, or anything that might change frequently as requiring a web search. If the query mentions 'current', 'latest', 'today', 'now', or similar time indicators, it likely requires a web search. Also treat queries that contain instruction language like 'Send me', 'Find me', 'Get me a link to', etc. as requiring a web search, especially when they're asking about specific products, services, or websites.
 
 When enhancing a query:
 1. ALWAYS remove instruction language patterns like "Send me", "Find me", "Get me a link to", "Show me", etc.
@@ -201,25 +162,10 @@ When enhancing a query:
 6. Do NOT include any text like "I'm looking for" or "I want to know" - just the search query itself
 7. For link requests (e.g., "link to", "where to buy", "where to find"), add terms like "official website" or "buy online"
 8. For queries about "current" or "latest" information, include the current year ({current_date.split('-')[0]}) in the query, but ONLY if time relevance is important
-9. ALWAYS include direct links when the user specifically asks for links, URLs, or where to find something online. 
-DO NOT use Markdown format [text](URL). Instead, format links as descriptive text followed by the URL, like this: 
-'Check out Wikipedia: https://en.wikipedia.org/wiki/Example' or 'You can find it here: https://example.com'.
-
-Respond with just the enhanced query, nothing else."""
-
-# -----------------------------------------------------------------------------
-# WEB SEARCH DETERMINATION PROMPT
-# -----------------------------------------------------------------------------
-# Purpose: Determines if a message requires a web search to provide an accurate response
-# Original location: web/search.py
-# Status: MOVED - Successfully implemented in web/search.py
-def get_web_search_determination_prompt(current_date):
-    return f"""You are a helpful assistant that determines if a message requires a web search to provide an accurate response. 
-
-Today's date is {current_date}. Keep this in mind when evaluating if a query needs current information.
-
-IMPORTANT: Consider your own knowledge when deciding if a web search is needed. If the question is about general knowledge, historical facts, concepts, definitions, or other information that you already have reliable knowledge about, respond with 'No' to allow the assistant to answer directly without a web search. Only recommend web searches for:
-
-Respond with 'Yes' if the message requires current information from the web, or 'No' if it can be answered with general knowledge. 
+9. If the query is ambiguous, lacks context, or refers to previous messages (pronouns like "it", "this", "that", "they", "them", "there"), include the specific names, places, or entities from the conversation it refers to
+10. If the query mentions "hours", "location", "address", "price", or similar, it's likely a search about a specific place or item mentioned in the context
+11. If the conversation is about specific products or services, do not add the current year to the query
+12. If the query is already clear and specific, return it unchanged
 
-IMPORTANT: Always respond with 'Yes' for queries about time-sensitive information such as weather, current events, news, sports scores, stock prices, or anything that might change frequently. If the query mentions 'current', 'latest', 'today', 'now', or similar time indicators, it likely requires a web search. Also respond with 'Yes' for queries that contain instruction language like 'Send me', 'Find me', 'Get me a link to', etc., especially when they're asking about specific products, services, or websites.""" 
\ No newline at end of file
+Respond with ONLY a JSON object in exactly this format, with no other text:
+{{"is_search": true or false, "enhanced_query": "the enhanced search query, or an empty string if no search is needed"}}"""
@@ -7,11 +7,18 @@ import backoff
 import openai
 import os
 import sys
-from datetime import datetime, timedelta
 import time
-import traceback
-from typing import Union
+import functools
 import hashlib
+from typing import Union
+from collections import OrderedDict
+from requests.adapters import HTTPAdapter
+
+try:
+    import orjson
+except ImportError:
+    # Fall back to requests' stdlib JSON decoding
+    orjson = None
 
 # Import configuration
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -21,26 +28,307 @@ from ai.openai_client import check_rate_limit
 from prompts_config import (
     SEARCH_SUMMARIZATION_PROMPT, 
     FOLLOW_UP_QUESTION_PROMPT, 
-    get_query_enhancement_prompt_1,
-    get_query_enhancement_prompt_2,
-    get_web_search_determination_prompt,
+    get_search_and_enhancement_combined_prompt,
     get_current_date_formatted
 )
 
 # Google Search API URL
 GOOGLE_SEARCH_URL = "https://www.googleapis.com/customsearch/v1"
 
-# Cache for search results
+# Shared session so Google API calls reuse pooled keep-alive connections
+_GOOGLE_SESSION = requests.Session()
+_GOOGLE_SESSION.mount('https://', HTTPAdapter(pool_maxsize=16))
+
+# Cache for search results (entries carry a time.monotonic() 'timestamp')
 SEARCH_CACHE = {}
 
-# Conversation context tracker
-CONVERSATION_CONTEXT = {}
+class ConvSlot:
+    """
+    Conversation context tracked for a single chat
+    """
+    __slots__ = (
+        "recent_messages", "topics", "entities", "entity_str_cache",
+        "formatted_context", "context_tail", "last_updated"
+    )
+    
+    def __init__(self):
+        self.recent_messages = []
+        # Most recently mentioned topics, oldest first (used as an insertion-ordered set)
+        self.topics = OrderedDict()
+        self.entities = set()
+        # Space-joined entities; reset to None whenever entities is modified
+        self.entity_str_cache = None
+        # Search detection context built from recent_messages; reset to None whenever recent_messages changes
+        self.formatted_context = None
+        # Last three formatted context messages, the conversation part of the enhancement cache key
+        self.context_tail = ()
+        self.last_updated = 0.0
+
+# Conversation context tracker (chat_guid -> ConvSlot), least recently updated first
+CONVERSATION_CONTEXT = OrderedDict()
+CONVERSATION_CONTEXT_MAX = 512
 
 # Direct context tracking for recent searches (chat_guid -> {query, summary})
 LAST_SEARCH = {}
 
-# Cache for search detection results
-SEARCH_DETECTION_CACHE = {}
+# Cache for search detection results ((chat_guid, hash(text)) -> result), least recently used first
+SEARCH_DETECTION_CACHE = OrderedDict()
+SEARCH_DETECTION_CACHE_MAX = 2048
+
+# Cache for context enhancement results ((last three context messages, clean text) -> result),
+# least recently used first
+ENHANCEMENT_CACHE = OrderedDict()
+ENHANCEMENT_CACHE_MAX = 1024
+
+# Cache for summaries of queries without conversation context
+# ((query, results hash) -> (time.monotonic() timestamp, summary)), least recently used first
+SUMMARY_CACHE = OrderedDict()
+SUMMARY_CACHE_MAX = 256
+SUMMARY_CACHE_TTL = 600  # seconds
+
+# Returned by _cache_get on a miss (cached values may be falsy)
+_CACHE_MISS = object()
+
+# Punctuation stripped from words during topic extraction
+_NON_WORD_RE = re.compile(r'[^\w\s]')
+
+# Maximum number of topics kept per conversation
+MAX_TOPICS = 200
+
+# Common words that pass the topic heuristics but carry no topic information
+_TOPIC_STOPWORDS = frozenset([
+    "about", "above", "after", "again", "also", "and", "any", "are", "assistant", "because", "been",
+    "before", "being", "below", "between", "but", "can", "could", "did", "does", "doing", "down",
+    "during", "each", "few", "for", "from", "further", "had", "has", "have", "having", "her", "here",
+    "hers", "him", "his", "how", "into", "its", "just", "know", "like", "more", "most", "not", "now",
+    "off", "once", "only", "other", "our", "ours", "out", "over", "own", "really", "same", "she",
+    "should", "some", "such", "tell", "than", "thank", "thanks", "that", "the", "their", "theirs",
+    "them", "then", "there", "these", "they", "think", "this", "those", "through", "under", "until",
+    "very", "was", "were", "what", "when", "where", "which", "while", "who", "whom", "why", "will",
+    "with", "would", "yes", "you", "your", "yours"
+])
+
+# Whole-word pronouns that suggest a message refers back to earlier conversation (matches "it?" too)
+_CONTEXT_PRONOUN_RE = re.compile(r"\b(?:it|this|that|these|those|they|them|their|there)\b", re.IGNORECASE)
+
+# Pronouns that suggest a query refers back to a previous search
+_FOLLOW_UP_PRONOUNS = frozenset(["they", "them", "their", "it", "its", "this", "that", "these", "those"])
+
+# Prefixes of queries that usually follow up on a previous one (a tuple for str.startswith)
+_FOLLOW_UP_STARTERS = ("how", "what", "when", "where", "why", "who", "which", "is", "are", "do", "does", "can", "could")
+
+# Time-sensitive query patterns used by is_realtime_information_query
+_TIME_PATTERNS = [
+    r"(current|latest|recent|today'?s|tonight'?s|tomorrow'?s|upcoming|live|now|right now)\s+.+",
+    r"what'?s\s+happening\s+(now|today|tonight|this\s+week|this\s+month)",
+    r"(news|weather|forecast|stock|price|score|event|update)\s+.+",
+    r"when\s+(is|will|does|do)\s+.+",
+    r"how\s+(is|are|much|many)\s+.+\s+(now|today|currently|at\s+the\s+moment)",
+    r"(2023|2024|2025)\s+.+",  # Current year references
+    r"what\s+is\s+the\s+(current|latest|today'?s)\s+.+",
+    r"who\s+is\s+(currently|now|presently)\s+.+"
+]
+
+# Word-anchored time patterns for _is_confident_search_request, so e.g. "now" doesn't match inside "know"
+_CONFIDENT_TIME_PATTERN_RE = re.compile("|".join(fr"\b(?:{p})" for p in _TIME_PATTERNS), re.IGNORECASE)
+
+# Realtime topic patterns used by is_realtime_information_query
+_REALTIME_TOPIC_PATTERNS = [
+    r"(weather|temperature|forecast|rain|snow|storm)",
+    r"(stock|market|price|trading|nasdaq|dow|s&p|bitcoin|crypto)",
+    r"(game|match|score|playing|tournament|championship)",
+    r"(news|headline|breaking|announced|released|launched)",
+    r"(traffic|delay|accident|road|flight|status)",
+    r"(election|poll|vote|campaign|president|candidate)",
+    r"(movie|show|concert|event|ticket|playing|streaming)",
+    r"(open|closed|hours|schedule|time)",
+    r"(covid|pandemic|virus|outbreak|cases)"
+]
+
+# Text cleanup patterns for search detection
+_CLEAN_PREFIX_RE = re.compile(r'^(?:nope|no|yes|yeah|yep|sure|oh|wow|nice)\b\.?\s*', re.IGNORECASE)
+_QUOTE_RE = re.compile(r'[\'"]')
+_CONTROL_RE = re.compile(r'[\x00-\x1F\x7F-\x9F]')
+
+# URL patterns used to detect URL sharing in is_web_search_request
+_URL_PATTERN = r'https?://(?:[-\w.]|(?:%[\da-fA-F]{2}))+'
+_URL_RE = re.compile(_URL_PATTERN)
+_URL_LINE_RE = re.compile(f'^{_URL_PATTERN}$')
+
+# Removes quotes, control characters and a single letter prefix (e.g. "a hello") from
+# context messages in one pass. Equivalent to stripping quotes, then the prefix
+# r'^\s*[a-z]\s+', then control characters, which is why quotes may appear
+# around the prefix letter
+_CONTEXT_MESSAGE_CLEAN_RE = re.compile(r'^[\s\'"]*[a-z][\'"]*\s[\s\'"]*|[\'"\x00-\x1F\x7F-\x9F]', re.IGNORECASE)
+
+# Any of the triggers that make _ai_search_detection enhance a query with context:
+# pronouns, question words, instruction language and link requests
+_CONTEXT_ENHANCE_TRIGGER_RE = re.compile(
+    r'\b(?:it|this|that|these|those|they|them|their|there|what|where|when|how|'
+    r'send me|find me|get me|show me|give me|can you (?:find|send|get|show|give)|'
+    r'link to|link for|where to (?:buy|find|get)|where can i (?:buy|find|get))\b',
+    re.IGNORECASE
+)
+
+# Explicit time references used by is_realtime_information_query
+_TIME_REFERENCES = [
+    "today", "tonight", "tomorrow", "this week", "this month", "this year",
+    "now", "currently", "at the moment", "right now", "present"
+]
+
+# Time patterns, realtime topics and time references as a single alternation so
+# is_realtime_information_query scans the text once
+_REALTIME_QUERY_RE = re.compile("|".join(
+    [f"(?:{p})" for p in _TIME_PATTERNS + _REALTIME_TOPIC_PATTERNS] + [re.escape(r) for r in _TIME_REFERENCES]
+), re.IGNORECASE)
+
+# Keywords that suggest a search query
+_SEARCH_KEYWORDS = [
+    "search", "google", "look up", "find", "information", "data",
+    "statistics", "facts", "details", "research", "learn about",
+    "tell me about", "what is", "who is", "where is", "when did",
+    "why does", "how to", "latest", "current", "recent", "news"
+]
+_SEARCH_KEYWORDS_RE = re.compile("|".join(map(re.escape, _SEARCH_KEYWORDS)), re.IGNORECASE)
+
+# Whole-word search keywords for _is_confident_search_request
+_CONFIDENT_SEARCH_KEYWORDS_RE = re.compile(r"\b(?:" + "|".join(map(re.escape, _SEARCH_KEYWORDS)) + r")\b", re.IGNORECASE)
+
+# Instruction language patterns (e.g. "send me a link")
+_INSTRUCTION_PATTERN_RE = re.compile("|".join(map(re.escape, [
+    "send me", "find me", "get me", "show me", "give me",
+    "can you find", "can you send", "can you get", "can you show", "can you give"
+])), re.IGNORECASE)
+
+# Link request patterns
+_LINK_REQUEST_RE = re.compile("|".join(map(re.escape, [
+    "link to", "link for", "where to buy", "where to find",
+    "where can i buy", "where can i find", "where to get", "where can i get"
+])), re.IGNORECASE)
+
+# Phrases that suggest a recent image analysis in the conversation
+_IMAGE_ANALYSIS_INDICATOR_RE = re.compile("|".join(map(re.escape, [
+    # Plants
+    "plant", "snake plant", "sansevieria",
+    # General identification phrases
+    "looks like", "appears to be", "this is a", "that's a", "that is a",
+    # Colors (often indicate product descriptions)
+    "color", "purple", "blue", "red", "green", "yellow", "black", "white",
+    # Food and beverages
+    "can", "bottle", "drink", "soda", "flavor", "tasty", "dr pepper", "coca-cola", "pepsi"
+])), re.IGNORECASE)
+
+# Plant types recognised in recent image analysis, matched in a single scan
+_PLANT_TYPE_RE = re.compile("|".join(map(re.escape, [
+    "snake plant", "sansevieria", "orchid", "succulent", "cactus", "fern", "monstera", "pothos", "philodendron"
+])), re.IGNORECASE)
+
+# Product names that indicate a product was identified in an image analysis
+_PRODUCT_INDICATOR_RE = re.compile("|".join(map(re.escape, [
+    "dr pepper", "coca-cola", "pepsi", "sprite", "fanta", "mountain dew", "blackberry", "zero sugar"
+])), re.IGNORECASE)
+
+# Product, object and color + object descriptions extracted from (lowercased) image analysis messages
+_PRODUCT_NAME_RE = re.compile(r"(?:(?:that|this)(?:'s| is)? (?:a|an)? )?([a-zA-Z\s]+ (?:dr pepper|coca-cola|pepsi|sprite|fanta|mountain dew|zero sugar)[a-zA-Z\s]*)")
+_OBJECT_NAME_RE = re.compile(r"(?:that'?s|this is)(?: a| an)?(?: type of)? ([a-zA-Z\s]+?)(?:!|\.|,|\n|$| that| which| and)")
+_COLOR_OBJECT_RE = re.compile(r"((?:[a-zA-Z]+\s)?(?:purple|blue|red|green|yellow|black|white)\s[a-zA-Z]+)")
+
+# Patterns that indicate follow-up questions (matched against the lowercased query)
+_FOLLOWUP_PATTERNS = [re.compile(p) for p in [
+    r"^(how|what|when|where|why|who|which)",  # Questions starting with wh-words
+    r"^(is|are|was|were|do|does|did|can|could|would|should|will)",  # Questions starting with auxiliary verbs
+    r"^(and|but|so|then)",  # Questions starting with conjunctions
+    r"^(how much|how many)",  # Specific question phrases
+    r"(they|them|those|these|that|this|it|he|she|his|her|their|its)"  # Pronouns indicating reference to previous context
+]]
+
+# Patterns for vague questions that likely refer to previous context (matched against the lowercased query)
+_VAGUE_FOLLOWUP_PATTERNS = [re.compile(p) for p in [
+    r"(your|my) (pick|choice|recommendation|suggestion|opinion|thought)",  # "What is your pick?"
+    r"(which|what) (one|should|would|do you) (i|you) (choose|pick|select|recommend|suggest)",  # "Which should I choose?"
+    r"(best|better|preferred|recommended) (option|choice|pick|selection)",  # "What's the best option?"
+    r"(any|have) (preference|recommendation|suggestion)",  # "Do you have any preference?"
+    r"(what|how) about",  # "What about...?"
+    r"(tell|give) me more",  # "Tell me more"
+    r"(anything|something) else",  # "Anything else?"
+    r"^(yes|no|maybe|sure|okay|fine|alright|great|perfect)",  # Short responses that likely refer to previous context
+    r"^(i|we) (like|prefer|want|need|choose|pick|select)",  # "I prefer..."
+    r"^(can|could) you",  # "Can you..."
+]]
+
+# Weather-related keywords used by is_weather_query
+_WEATHER_KEYWORDS_RE = re.compile("|".join(map(re.escape, [
+    "weather", "temperature", "forecast", "rain", "snow", "storm",
+    "sunny", "cloudy", "humidity", "wind", "precipitation", "cold",
+    "hot", "warm", "chilly", "freezing", "degrees"
+])), re.IGNORECASE)
+
+# Weather-related patterns used by is_weather_query
+_WEATHER_PATTERNS = [
+    r"weather\s+(in|for|at)\s+.+",
+    r"temperature\s+(in|at)\s+.+",
+    r"is\s+it\s+(raining|snowing|cold|hot|warm|sunny|cloudy)\s+(in|at)\s+.+",
+    r"what'?s\s+the\s+(weather|forecast|temperature)\s+(like|in|at|for)\s+.+",
+    r"how\s+(cold|hot|warm|chilly)\s+is\s+it\s+(in|at)\s+.+",
+    r"will\s+it\s+(rain|snow|be\s+cold|be\s+hot|be\s+sunny|be\s+cloudy)\s+(in|at|today|tomorrow|this\s+week)\s+.+"
+]
+_WEATHER_PATTERN_RE = re.compile("|".join(f"(?:{p})" for p in _WEATHER_PATTERNS), re.IGNORECASE)
+
+# Uncertainty indicators in an AI response used by needs_supplemental_web_search
+_UNCERTAINTY_PATTERNS = [
+    r"I don'?t have (the latest|current|up-to-date|real-time) information",
+    r"I don'?t have access to (the latest|current|up-to-date|real-time) information",
+    r"my (knowledge|information|data) (is limited to|only goes up to|cuts off at)",
+    r"I (can'?t|cannot|don'?t) (access|browse|search) the (internet|web)",
+    r"I (don'?t have|lack|cannot access) (current|real-time|live) data",
+    r"my training (data|cut-off|knowledge) (is|was) (in|from|before)",
+    r"I (don'?t|cannot|can'?t) provide (current|real-time|up-to-date) information",
+    r"for the most (current|up-to-date|recent) information",
+    r"you (may|might|should|could) (want to|need to) (check|verify|look up)",
+    r"I'?m not (able to|capable of) (searching|browsing|accessing) the (internet|web)"
+]
+_UNCERTAINTY_RE = re.compile("|".join(f"(?:{p})" for p in _UNCERTAINTY_PATTERNS), re.IGNORECASE)
+
+# Domain part of a URL used by extract_domain
+_DOMAIN_RE = re.compile(r'https?://(?:www\.)?([^/]+)')
+
+# Capitalized words (potential entities) used by _is_likely_related
+_CAPITALIZED_WORD_RE = re.compile(r'\b[A-Z][a-z]+\b')
+
+# Cleanup pattern for interpreted follow-up queries
+_INTERPRETED_QUERY_PREFIX_RE = re.compile(r'^(query|search|search query|enhanced query|interpreted query)[:\-]?\s*', re.IGNORECASE)
+
+def _cache_get(cache, key):
+    """
+    Look up a key in an LRU cache and mark it as most recently used
+    
+    Args:
+        cache (OrderedDict): Cache to read from
+        key: Cache key
+        
+    Returns:
+        The cached value, or _CACHE_MISS if the key isn't cached
+    """
+    value = cache.get(key, _CACHE_MISS)
+    if value is not _CACHE_MISS:
+        cache.move_to_end(key)
+    return value
+
+def _cache_put(cache, key, value, max_size):
+    """
+    Store a value in an LRU cache, evicting the least recently used entries
+    once the cache holds more than max_size entries
+    
+    Args:
+        cache (OrderedDict): Cache to write to
+        key: Cache key
+        value: Value to store
+        max_size (int): Maximum number of entries to keep
+    """
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > max_size:
+        cache.popitem(last=False)
 
 def update_conversation_context(chat_guid, message):
     """
@@ -57,61 +345,62 @@ def update_conversation_context(chat_guid, message):
         return
     
     try:
-        # Initialize conversation context if it doesn't exist
-        if not hasattr(sys.modules[__name__], 'CONVERSATION_CONTEXT'):
-            global CONVERSATION_CONTEXT
-            CONVERSATION_CONTEXT = {}
-        
-        # Initialize context for this chat if it doesn't exist
-        if chat_guid not in CONVERSATION_CONTEXT:
-            CONVERSATION_CONTEXT[chat_guid] = {
-                'recent_messages': [],
-                'topics': set(),
-                'entities': set(),
-                'last_updated': time.time()
-            }
-        
         # Clean the message before adding it to context
         # Remove any control characters that might cause issues
-        clean_message = re.sub(r'[\x00-\x1F\x7F-\x9F]', '', message)
+        clean_message = _CONTROL_RE.sub('', message)
+        
+        # Initialize context for this chat if it doesn't exist, evicting the least
+        # recently updated chats once there are more than CONVERSATION_CONTEXT_MAX
+        ctx = CONVERSATION_CONTEXT.get(chat_guid)
+        if ctx is None:
+            ctx = CONVERSATION_CONTEXT.setdefault(chat_guid, ConvSlot())
+            while len(CONVERSATION_CONTEXT) > CONVERSATION_CONTEXT_MAX:
+                CONVERSATION_CONTEXT.popitem(last=False)
+        else:
+            CONVERSATION_CONTEXT.move_to_end(chat_guid)
         
         # Add message to recent messages
-        recent_messages = CONVERSATION_CONTEXT[chat_guid]['recent_messages']
+        recent_messages = ctx.recent_messages
         
         # Log the message history before update
-        logging.info(f"🔍 Message history before update: {recent_messages}")
+        logging.info("🔍 Message history before update: %s", recent_messages)
         
         # Keep only the last 10 messages (increased from 5 for better context)
         if len(recent_messages) >= 10:
             removed_message = recent_messages.pop(0)
-            logging.info(f"🔍 Removed oldest message from history: '{removed_message}'")
+            logging.info("🔍 Removed oldest message from history: '%s'", removed_message)
         
         # Add the current message
         recent_messages.append(clean_message)
+        ctx.formatted_context = None
+        ctx.context_tail = ()
         
         # Log the message history after update
-        logging.info(f"🔍 Message history after update: {recent_messages}")
+        logging.info("🔍 Message history after update: %s", recent_messages)
         
         # Extract topics from the message
         try:
             topics = extract_topics_from_message(chat_guid, clean_message)
-            # Update topics
-            CONVERSATION_CONTEXT[chat_guid]['topics'].update(topics)
+            # Update topics, moving repeated ones to the most recent position
+            for topic in topics:
+                ctx.topics[topic] = None
+                ctx.topics.move_to_end(topic)
+            # Keep only the most recent topics
+            while len(ctx.topics) > MAX_TOPICS:
+                ctx.topics.popitem(last=False)
         except Exception as e:
-            logging.error(f"❌ Error extracting topics: {e}")
-            logging.error(traceback.format_exc())
+            logging.exception("❌ Error extracting topics: %s", e)
         
         # Update last updated timestamp
-        CONVERSATION_CONTEXT[chat_guid]['last_updated'] = time.time()
+        ctx.last_updated = time.monotonic()
         
         # Log context tracking information
-        logging.info(f"🔍 Context tracking - Recent messages: {recent_messages}")
-        logging.info(f"🔍 Context tracking - Detected entities: {CONVERSATION_CONTEXT[chat_guid]['entities']}")
-        logging.info(f"🔍 Context tracking - Topics: {CONVERSATION_CONTEXT[chat_guid]['topics']}")
+        logging.info("🔍 Context tracking - Recent messages: %s", recent_messages)
+        logging.info("🔍 Context tracking - Detected entities: %s", ctx.entities)
+        logging.info("🔍 Context tracking - Topics: %s", list(ctx.topics))
     
     except Exception as e:
-        logging.error(f"❌ Error updating conversation context: {e}")
-        logging.error(traceback.format_exc())
+        logging.exception("❌ Error updating conversation context: %s", e)
 
 def extract_topics_from_message(chat_guid, message):
     """
@@ -120,19 +409,24 @@ def extract_topics_from_message(chat_guid, message):
     Args:
         chat_guid (str): Chat GUID
         message (str): Message text
+        
+    Returns:
+        list: Topics in the order they appear in the message
     """
     # Simple extraction of nouns and named entities
     # This is a basic implementation - could be improved with NLP
     words = message.split()
-    topics = set()
+    topics = {}
     for word in words:
         # Only add words that are likely nouns (capitalized or longer than 4 chars)
         if len(word) > 4 or (len(word) > 1 and word[0].isupper()):
             # Clean up the word (remove punctuation)
-            clean_word = re.sub(r'[^\w\s]', '', word).strip()
+            clean_word = _NON_WORD_RE.sub('', word)
             if clean_word and len(clean_word) > 2:
-                topics.add(clean_word.lower())
-    return topics
+                clean_word = clean_word.lower()
+                if clean_word not in _TOPIC_STOPWORDS:
+                    topics[clean_word] = None
+    return list(topics)
 
 def get_context_for_search(chat_guid, query):
     """
@@ -145,11 +439,12 @@ def get_context_for_search(chat_guid, query):
     Returns:
         str: Enhanced search query with context
     """
-    if not chat_guid or chat_guid not in CONVERSATION_CONTEXT:
+    ctx = CONVERSATION_CONTEXT.get(chat_guid) if chat_guid else None
+    if ctx is None:
         return query
     
     # Get recent messages
-    recent_messages = CONVERSATION_CONTEXT[chat_guid]['recent_messages']
+    recent_messages = ctx.recent_messages
     
     # If this is the first message, no context to add
     if len(recent_messages) <= 1:
@@ -165,7 +460,8 @@ def get_context_for_search(chat_guid, query):
     # Check if the query is likely a follow-up question
     is_followup = is_followup_question(query)
     is_short_query = len(query.split()) <= 5
-    has_pronouns = any(pronoun in query.lower() for pronoun in ["it", "they", "them", "their", "its", "this", "that", "these", "those"])
+    query_lower = query.lower()
+    has_pronouns = any(pronoun in query_lower for pronoun in ["it", "they", "them", "their", "its", "this", "that", "these", "those"])
     
     # Log detection results for debugging
     if is_followup:
@@ -178,8 +474,10 @@ def get_context_for_search(chat_guid, query):
     # If query is likely a follow-up or contains pronouns, enhance it with context
     if is_followup or is_short_query or has_pronouns:
         # Get entities from context
-        entities = CONVERSATION_CONTEXT[chat_guid]['entities']
-        entity_str = " ".join(entities) if entities else ""
+        entities = ctx.entities
+        if ctx.entity_str_cache is None:
+            ctx.entity_str_cache = " ".join(entities)
+        entity_str = ctx.entity_str_cache
         
         # Create different enhanced queries based on the situation
         if entities and (has_pronouns or is_short_query):
@@ -205,38 +503,17 @@ def is_followup_question(query):
     Returns:
         bool: True if likely a follow-up question
     """
-    # Patterns that indicate follow-up questions
-    followup_patterns = [
-        r"^(how|what|when|where|why|who|which)",  # Questions starting with wh-words
-        r"^(is|are|was|were|do|does|did|can|could|would|should|will)",  # Questions starting with auxiliary verbs
-        r"^(and|but|so|then)",  # Questions starting with conjunctions
-        r"^(how much|how many)",  # Specific question phrases
-        r"(they|them|those|these|that|this|it|he|she|his|her|their|its)"  # Pronouns indicating reference to previous context
-    ]
+    query_lower = query.lower()
     
     # Check if the query matches any follow-up patterns
-    for pattern in followup_patterns:
-        if re.search(pattern, query.lower()):
+    for pattern in _FOLLOWUP_PATTERNS:
+        if pattern.search(query_lower):
             return True
     
-    # Additional patterns for vague questions that likely refer to previous context
-    vague_followup_patterns = [
-        r"(your|my) (pick|choice|recommendation|suggestion|opinion|thought)",  # "What is your pick?"
-        r"(which|what) (one|should|would|do you) (i|you) (choose|pick|select|recommend|suggest)",  # "Which should I choose?"
-        r"(best|better|preferred|recommended) (option|choice|pick|selection)",  # "What's the best option?"
-        r"(any|have) (preference|recommendation|suggestion)",  # "Do you have any preference?"
-        r"(what|how) about",  # "What about...?"
-        r"(tell|give) me more",  # "Tell me more"
-        r"(anything|something) else",  # "Anything else?"
-        r"^(yes|no|maybe|sure|okay|fine|alright|great|perfect)",  # Short responses that likely refer to previous context
-        r"^(i|we) (like|prefer|want|need|choose|pick|select)",  # "I prefer..."
-        r"^(can|could) you",  # "Can you..."
-    ]
-    
     # Check if the query matches any vague follow-up patterns
-    for pattern in vague_followup_patterns:
-        if re.search(pattern, query.lower()):
-            logging.info(f"🔍 Detected vague follow-up question: '{query}' (matched pattern: {pattern})")
+    for pattern in _VAGUE_FOLLOWUP_PATTERNS:
+        if pattern.search(query_lower):
+            logging.info(f"🔍 Detected vague follow-up question: '{query}' (matched pattern: {pattern.pattern})")
             return True
     
     # Check if the query is very short (likely a follow-up)
@@ -273,11 +550,8 @@ def is_web_search_request(text, chat_guid=None):
             update_conversation_context(chat_guid, text)
         return True
     
-    # Check if the text is just a URL or multiple URLs
-    url_pattern = r'https?://(?:[-\w.]|(?:%[\da-fA-F]{2}))+'
-    
     # If the text contains a lot of URLs, it's likely URL sharing, not a search request
-    url_matches = re.findall(url_pattern, text)
+    url_matches = _URL_RE.findall(text)
     if len(url_matches) > 0:
         # If more than 50% of the text is URLs, it's likely URL sharing
         url_text_length = sum(len(url) for url in url_matches)
@@ -288,7 +562,7 @@ def is_web_search_request(text, chat_guid=None):
     # Split by newlines to handle multiple URLs
     lines = text.strip().split('\n')
     # Check if all lines are URLs
-    all_lines_are_urls = all(re.match(f'^{url_pattern}$', line.strip()) for line in lines if line.strip())
+    all_lines_are_urls = all(_URL_LINE_RE.match(line.strip()) for line in lines if line.strip())
     
     # If the text is just one or more URLs, it's not a search request
     if all_lines_are_urls and len(lines) >= 1:
@@ -297,7 +571,7 @@ def is_web_search_request(text, chat_guid=None):
     
     # Check if this is a message about a URL (e.g., "This is the url...")
     if len(lines) <= 3:  # Short message
-        url_count = sum(1 for line in lines if re.search(url_pattern, line))
+        url_count = sum(1 for line in lines if _URL_RE.search(line))
         if url_count > 0 and url_count == len(lines):
             logging.info(f"🔗 Detected URL sharing (all lines are URLs), not treating as search request: {text[:100]}...")
             return False
@@ -305,34 +579,41 @@ def is_web_search_request(text, chat_guid=None):
     # Use AI to determine if this is a search request
     try:
         # First check if we have a cached result
-        cache_key = hashlib.md5(text.encode()).hexdigest()
-        if cache_key in SEARCH_DETECTION_CACHE:
-            result = SEARCH_DETECTION_CACHE[cache_key]
+        cache_key = (chat_guid, hash(text))
+        result = _cache_get(SEARCH_DETECTION_CACHE, cache_key)
+        if result is not _CACHE_MISS:
             logging.info(f"🔍 Using cached search detection result: {result}")
             return result
         
+        # Initialize context for this chat if it doesn't exist
+        if chat_guid and chat_guid not in CONVERSATION_CONTEXT:
+            logging.info(f"🔍 Chat GUID {chat_guid} not found in CONVERSATION_CONTEXT")
+            update_conversation_context(chat_guid, text)
+            if chat_guid in CONVERSATION_CONTEXT:
+                logging.info(f"🔍 Successfully initialized context for chat_guid: {chat_guid}")
+            else:
+                logging.info(f"🔍 Failed to initialize context for chat_guid: {chat_guid}")
+        
+        # Short follow-ups in a chat with earlier messages still need context enhancement
+        ctx = CONVERSATION_CONTEXT.get(chat_guid) if chat_guid else None
+        has_earlier_messages = ctx is not None and len(ctx.recent_messages) >= 2
+        is_short_query = len(_strip_query_filler(text).split()) <= 5
+        
+        # Skip the AI round-trip when the cheap detectors are confident
+        if (not has_earlier_messages or not is_short_query) and _is_confident_search_request(text):
+            logging.info(f"🔍 Search keywords and time-sensitive patterns matched in a question, skipping AI search detection")
+            result = True
         # If we have chat_guid, use conversation context for better detection
-        if chat_guid and chat_guid in CONVERSATION_CONTEXT:
+        elif chat_guid and chat_guid in CONVERSATION_CONTEXT:
             logging.info(f"🔍 Using recent messages for search detection context from chat_guid: {chat_guid}")
             result = _ai_search_detection(text, chat_guid)
         else:
-            if chat_guid:
-                logging.info(f"🔍 Chat GUID {chat_guid} not found in CONVERSATION_CONTEXT")
-                # Initialize context for this chat if it doesn't exist
-                update_conversation_context(chat_guid, text)
-                # Try again with the newly initialized context
-                if chat_guid in CONVERSATION_CONTEXT:
-                    logging.info(f"🔍 Successfully initialized context for chat_guid: {chat_guid}")
-                    result = _ai_search_detection(text, chat_guid)
-                else:
-                    logging.info(f"🔍 Failed to initialize context for chat_guid: {chat_guid}")
-                    result = _ai_search_detection(text)
-            else:
+            if not chat_guid:
                 logging.info(f"🔍 No chat_guid provided, using default search detection")
-                result = _ai_search_detection(text)
+            result = _ai_search_detection(text)
         
         # Cache the result
-        SEARCH_DETECTION_CACHE[cache_key] = result
+        _cache_put(SEARCH_DETECTION_CACHE, cache_key, result, SEARCH_DETECTION_CACHE_MAX)
         
         if result:
             logging.info(f"🔍 AI determined this is a search request")
@@ -341,10 +622,40 @@ def is_web_search_request(text, chat_guid=None):
         
         return result
     except Exception as e:
-        logging.error(f"❌ Error in search detection: {e}")
-        logging.error(traceback.format_exc())
+        logging.exception("❌ Error in search detection: %s", e)
         return False
 
+def _is_confident_search_request(text):
+    """
+    Determine if a message is clearly a search request without asking the AI
+    
+    Only questions (ending in "?") that contain a whole-word search keyword and
+    a time-sensitive pattern qualify, so casual statements such as "I know the
+    details already" never skip the AI. Messages with pronouns, instruction
+    language or link requests still go to the AI so the query can be enhanced
+    with context. Callers must also skip this shortcut for short follow-ups in a
+    chat with earlier messages, since those get context enhancement as well.
+    
+    Args:
+        text (str): Message text
+        
+    Returns:
+        bool: True if the message is confidently a search request
+    """
+    if not text.rstrip().endswith("?"):
+        return False
+    
+    if _CONTEXT_PRONOUN_RE.search(text):
+        return False
+    
+    if _INSTRUCTION_PATTERN_RE.search(text) or _LINK_REQUEST_RE.search(text):
+        return False
+    
+    if not _CONFIDENT_SEARCH_KEYWORDS_RE.search(text):
+        return False
+    
+    return bool(_CONFIDENT_TIME_PATTERN_RE.search(text))
+
 def is_realtime_information_query(text):
     """
     Determine if a query requires realtime information
@@ -357,49 +668,9 @@ def is_realtime_information_query(text):
     """
     if not text:
         return False
-        
-    # Check for time-sensitive keywords
-    time_patterns = [
-        r"(?i)(current|latest|recent|today'?s|tonight'?s|tomorrow'?s|upcoming|live|now|right now)\s+.+",
-        r"(?i)what'?s\s+happening\s+(now|today|tonight|this\s+week|this\s+month)",
-        r"(?i)(news|weather|forecast|stock|price|score|event|update)\s+.+",
-        r"(?i)when\s+(is|will|does|do)\s+.+",
-        r"(?i)how\s+(is|are|much|many)\s+.+\s+(now|today|currently|at\s+the\s+moment)",
-        r"(?i)(2023|2024|2025)\s+.+",  # Current year references
-        r"(?i)what\s+is\s+the\s+(current|latest|today'?s)\s+.+",
-        r"(?i)who\s+is\s+(currently|now|presently)\s+.+"
-    ]
-    
-    for pattern in time_patterns:
-        if re.search(pattern, text):
-            return True
-    
-    # Check for specific realtime topics
-    realtime_topics = [
-        r"(?i)(weather|temperature|forecast|rain|snow|storm)",
-        r"(?i)(stock|market|price|trading|nasdaq|dow|s&p|bitcoin|crypto)",
-        r"(?i)(game|match|score|playing|tournament|championship)",
-        r"(?i)(news|headline|breaking|announced|released|launched)",
-        r"(?i)(traffic|delay|accident|road|flight|status)",
-        r"(?i)(election|poll|vote|campaign|president|candidate)",
-        r"(?i)(movie|show|concert|event|ticket|playing|streaming)",
-        r"(?i)(open|closed|hours|schedule|time)",
-        r"(?i)(covid|pandemic|virus|outbreak|cases)"
-    ]
     
-    for pattern in realtime_topics:
-        if re.search(pattern, text):
-            return True
-            
-    # Check for explicit time references
-    time_references = ["today", "tonight", "tomorrow", "this week", "this month", "this year", 
-                      "now", "currently", "at the moment", "right now", "present"]
-    
-    for reference in time_references:
-        if reference in text.lower():
-            return True
-    
-    return False
+    # Check for time-sensitive keywords, realtime topics and explicit time references
+    return bool(_REALTIME_QUERY_RE.search(text))
 
 def _keyword_search_detection(text):
     """
@@ -411,25 +682,79 @@ def _keyword_search_detection(text):
     Returns:
         bool: True if search is needed
     """
-    # Keywords that suggest a search query
-    search_keywords = [
-        "search", "google", "look up", "find", "information", "data", 
-        "statistics", "facts", "details", "research", "learn about",
-        "tell me about", "what is", "who is", "where is", "when did",
-        "why does", "how to", "latest", "current", "recent", "news"
-    ]
-    
     # Check for question marks
     if "?" in text:
         # Questions are likely search queries
         return True
     
     # Check for search keywords
-    for keyword in search_keywords:
-        if keyword.lower() in text.lower():
-            return True
+    return bool(_SEARCH_KEYWORDS_RE.search(text))
+
+@functools.lru_cache(maxsize=4096)
+def _strip_query_filler(query):
+    """
+    Remove leading filler words (e.g. "Nope.", "Yeah") and quotes from a query
     
-    return False
+    Args:
+        query (str): Query text
+        
+    Returns:
+        str: Cleaned query text
+    """
+    query = _CLEAN_PREFIX_RE.sub('', query)
+    query = _QUOTE_RE.sub('', query)  # Remove quotes
+    return query.strip()
+
+def _normalize_query(query):
+    """
+    Normalize a query for cache lookups so trivial variations (case, spacing,
+    trailing punctuation) share an entry
+    
+    Args:
+        query (str): Query text
+        
+    Returns:
+        str: Normalized query
+    """
+    return " ".join(query.casefold().split()).rstrip("?!.")
+
+@functools.lru_cache(maxsize=4096)
+def _clean_context_message(msg):
+    """
+    Remove quotes, single letter prefixes and control characters from a context message
+    
+    Args:
+        msg (str): Previous message from the conversation context
+        
+    Returns:
+        str: Cleaned message
+    """
+    return _CONTEXT_MESSAGE_CLEAN_RE.sub('', msg)
+
+def _enhanced_query_result(enhanced_query, text):
+    """
+    Validate an AI-enhanced search query
+    
+    The query comes from a JSON field, so it only needs whitespace trimmed; filler
+    stripping would cut real words such as "Nice" in "Nice France events".
+    
+    Args:
+        enhanced_query (str): Enhanced query returned by the model
+        text (str): Original message text
+        
+    Returns:
+        Union[bool, str]: The enhanced query, or True to search with the original text
+    """
+    enhanced_query = enhanced_query.strip()
+    
+    # Ensure the enhanced query is not malformed
+    if enhanced_query and len(enhanced_query) > 3:
+        logging.info(f"🔍 AI enhanced search query: '{enhanced_query}' (original: '{text}')")
+        return enhanced_query
+    
+    # If the enhanced query is too short or empty, fall back to the original
+    logging.info(f"🔍 Enhanced query was too short, using original: '{text}'")
+    return True
 
 def _ai_search_detection(text, chat_guid=None):
     """
@@ -451,212 +776,137 @@ def _ai_search_detection(text, chat_guid=None):
         
         # Clean the input text before processing
         # Remove any leading "Nope." or similar responses and any odd characters
-        clean_text = re.sub(r'^(nope|no|yes|yeah|yep|sure|oh|wow|nice)\.?\s*', '', text, flags=re.IGNORECASE)
-        clean_text = re.sub(r'[\'"]', '', clean_text)  # Remove quotes
-        clean_text = clean_text.strip()
+        clean_text = _strip_query_filler(text)
         
         # Prepare context from recent conversation if available
         context = ""
         recent_context = []
         
-        if chat_guid and chat_guid in CONVERSATION_CONTEXT:
-            recent_messages = CONVERSATION_CONTEXT[chat_guid]['recent_messages']
-            logging.info(f"🔍 Available context messages: {recent_messages}")
+        ctx = CONVERSATION_CONTEXT.get(chat_guid) if chat_guid else None
+        if ctx is not None:
+            # Reuse the formatted context if no messages have been added since it was built
+            if ctx.formatted_context is not None:
+                context = ctx.formatted_context
+                logging.info("🔍 Reusing cached search detection context: %s", context)
+            else:
+                recent_messages = ctx.recent_messages
+                logging.info("🔍 Available context messages: %s", recent_messages)
             
-            # We need at least 2 messages for context (including the current one)
-            if recent_messages and len(recent_messages) >= 2:
-                # Get all messages except the current one
-                # The current message should be the last one in the list
-                previous_messages = recent_messages[:-1]
+                # We need at least 2 messages for context (including the current one)
+                if recent_messages and len(recent_messages) >= 2:
+                    # Get all messages except the current one
+                    # The current message should be the last one in the list
+                    previous_messages = recent_messages[:-1]
                 
-                if previous_messages:
-                    logging.info(f"🔍 Using previous messages for context: {previous_messages}")
-                    # Clean the messages before including them
-                    for msg in previous_messages:
-                        # Remove any odd characters and clean up the message
-                        clean_msg = re.sub(r'[\'"]', '', msg)  # Remove quotes
-                        clean_msg = re.sub(r'^\s*[a-z]\s+', '', clean_msg, flags=re.IGNORECASE)  # Remove single letter prefixes
-                        # Remove any trailing control characters
-                        clean_msg = re.sub(r'[\x00-\x1F\x7F-\x9F]', '', clean_msg)
+                    if previous_messages:
+                        logging.info("🔍 Using previous messages for context: %s", previous_messages)
+                        # Clean the messages before including them
+                        for msg in previous_messages:
+                            # Remove quotes, single letter prefixes and control characters (cached,
+                            # since the same messages recur across turns)
+                            clean_msg = _clean_context_message(msg)
                         
-                        # Check if this is an assistant message (prefixed with [ASSISTANT]:)
-                        if clean_msg.startswith('[ASSISTANT]:'):
-                            # Format assistant messages differently
-                            clean_msg = clean_msg[12:].strip()  # Remove the [ASSISTANT]: prefix
-                            if clean_msg:
-                                recent_context.append(f"Assistant: {clean_msg}")
-                        else:
-                            # Format user messages
-                            if clean_msg:
-                                recent_context.append(f"User: {clean_msg}")
+                            # Check if this is an assistant message (prefixed with [ASSISTANT]:)
+                            if clean_msg.startswith('[ASSISTANT]:'):
+                                # Format assistant messages differently
+                                clean_msg = clean_msg[12:].strip()  # Remove the [ASSISTANT]: prefix
+                                if clean_msg:
+                                    recent_context.append(f"Assistant: {clean_msg}")
+                            else:
+                                # Format user messages
+                                if clean_msg:
+                                    recent_context.append(f"User: {clean_msg}")
                     
-                    if recent_context:
-                        messages_context = "\n".join([f"- {msg}" for msg in recent_context])
-                        context = f"""Recent conversation context:
+                        if recent_context:
+                            messages_context = "\n".join([f"- {msg}" for msg in recent_context])
+                            context = f"""Recent conversation context:
 {messages_context}
 
 """
-                        logging.info(f"🔍 Using recent messages for search detection context: {context}")
+                            logging.info("🔍 Using recent messages for search detection context: %s", context)
+                        else:
+                            logging.info("🔍 No valid context messages after cleaning")
                     else:
-                        logging.info("🔍 No valid context messages after cleaning")
+                        logging.info("🔍 No previous messages found for context")
                 else:
-                    logging.info("🔍 No previous messages found for context")
-            else:
-                logging.info("🔍 Not enough messages in conversation context")
+                    logging.info("🔍 Not enough messages in conversation context")
+                
+                ctx.formatted_context = context
+                ctx.context_tail = tuple(recent_context[-3:])
         else:
             logging.info(f"🔍 No conversation context available for chat_guid: {chat_guid}")
         
-        # Check if this is likely a follow-up question with pronouns or short query
-        pronouns = ["it", "this", "that", "these", "those", "they", "them", "their", "there"]
-        has_pronouns = any(pronoun in clean_text.lower().split() for pronoun in pronouns)
+        # Check if this is likely a follow-up question: a short query or one with pronouns,
+        # question words, instruction language or a link request
         is_short_query = len(clean_text.split()) <= 5
+        trigger = _CONTEXT_ENHANCE_TRIGGER_RE.search(clean_text)
         
-        # Check for instruction language patterns
-        instruction_patterns = ["send me", "find me", "get me", "show me", "give me", "can you find", "can you send", "can you get", "can you show", "can you give"]
-        has_instruction_pattern = any(pattern in clean_text.lower() for pattern in instruction_patterns)
-        
-        # Check for link request patterns
-        link_request_patterns = ["link to", "link for", "where to buy", "where to find", "where can i buy", "where can i find", "where to get", "where can i get"]
-        has_link_request = any(pattern in clean_text.lower() for pattern in link_request_patterns)
-        
-        # If this has pronouns, is a short query, contains question words, has instruction patterns, or is a link request and we have context, ask the model to enhance the query
-        if (has_pronouns or is_short_query or has_instruction_pattern or has_link_request or "what" in clean_text.lower() or "where" in clean_text.lower() or "when" in clean_text.lower() or "how" in clean_text.lower()) and context:
-            logging.info(f"🔍 Attempting to enhance query with context. Has pronouns: {has_pronouns}, Is short query: {is_short_query}, Has instruction pattern: {has_instruction_pattern}, Has link request: {has_link_request}")
+        # If any trigger matched or this is a short query and we have context, ask the model to enhance the query
+        enhance_with_context = bool((trigger or is_short_query) and context)
+        if enhance_with_context:
+            logging.info(f"🔍 Attempting to enhance query with context. Trigger: {trigger.group(0) if trigger else None}, Is short query: {is_short_query}")
             
-            # Use DEFAULT_MODEL for consistency
-            logging.info(f"🔍 Using Query Enhancement Prompt 1 to evaluate search need and enhance query")
-            response = openai.chat.completions.create(
-                model=DEFAULT_MODEL,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": get_query_enhancement_prompt_1(current_date)
-                    },
-                    {
-                        "role": "user",
-                        "content": f"{context}Current message: {clean_text}\n\nDoes this message require a web search to provide an accurate response? If yes, enhance the query with relevant context. Answer with 'Yes: [enhanced query]' or just 'No'."
-                    }
-                ],
-                temperature=0.1,
-                max_tokens=100
-            )
+            enhancement_key = (ctx.context_tail, clean_text)
+            cached = _cache_get(ENHANCEMENT_CACHE, enhancement_key)
+            if cached is not _CACHE_MISS:
+                logging.info(f"🔍 Using cached query enhancement result: {cached}")
+                return cached
             
-            # Track token usage
-            if hasattr(response, 'usage'):
-                track_token_usage(
-                    model=DEFAULT_MODEL,
-                    prompt_tokens=response.usage.prompt_tokens,
-                    completion_tokens=response.usage.completion_tokens,
-                    purpose="search_detection"
-                )
-            
-            result = response.choices[0].message.content.strip()
-            logging.info(f"🔍 AI response for query enhancement: {result}")
-            
-            if result.lower().startswith("yes:"):
-                # Extract the enhanced query
-                enhanced_query = result[4:].strip()
-                
-                # Clean up the enhanced query
-                enhanced_query = re.sub(r'^(nope|no|yes|yeah|yep|sure|oh|wow|nice)\.?\s*', '', enhanced_query, flags=re.IGNORECASE)
-                enhanced_query = re.sub(r'[\'"]', '', enhanced_query)  # Remove quotes
-                enhanced_query = enhanced_query.strip()
-                
-                # Ensure the enhanced query is not malformed
-                if enhanced_query and len(enhanced_query) > 3:
-                    logging.info(f"🔍 AI enhanced search query: '{enhanced_query}' (original: '{text}')")
-                    return enhanced_query
-                else:
-                    # If the enhanced query is too short or empty, fall back to the original
-                    logging.info(f"🔍 Enhanced query was too short, using original: '{text}'")
-                    return True
-            elif result.lower() == "yes":
-                logging.info(f"🔍 AI determined this is a search request but did not provide an enhanced query")
-                return True
-            else:
-                # Removed duplicate log message
-                return False
+            question = "Does this message require a web search to provide an accurate response? If yes, enhance the query with relevant context from the conversation. Respond with the JSON object only."
         else:
             if not context:
                 logging.info(f"🔍 No context available for query enhancement")
-                
-                # Even without context, we should still enhance instruction-style queries and link requests
-                if has_instruction_pattern or has_link_request:
-                    logging.info(f"🔍 Enhancing instruction-style query or link request without context")
-                    # Use DEFAULT_MODEL for consistency
-                    logging.info(f"🔍 Using Query Enhancement Prompt 2 to enhance instruction-style query")
-                    response = openai.chat.completions.create(
-                        model=DEFAULT_MODEL,
-                        messages=[
-                            {
-                                "role": "system",
-                                "content": get_query_enhancement_prompt_2(current_date)
-                            },
-                            {
-                                "role": "user",
-                                "content": f"Enhance this search query by removing instruction language and focusing on the core search intent: {clean_text}"
-                            }
-                        ],
-                        temperature=0.1,
-                        max_tokens=50
-                    )
-                    
-                    # Track token usage
-                    if hasattr(response, 'usage'):
-                        track_token_usage(
-                            model=DEFAULT_MODEL,
-                            prompt_tokens=response.usage.prompt_tokens,
-                            completion_tokens=response.usage.completion_tokens,
-                            purpose="search_enhancement"
-                        )
-                    
-                    enhanced_query = response.choices[0].message.content.strip()
-                    
-                    # Clean up the enhanced query
-                    enhanced_query = re.sub(r'^(nope|no|yes|yeah|yep|sure|oh|wow|nice)\.?\s*', '', enhanced_query, flags=re.IGNORECASE)
-                    enhanced_query = re.sub(r'[\'"]', '', enhanced_query)  # Remove quotes
-                    enhanced_query = enhanced_query.strip()
-                    
-                    # Ensure the enhanced query is not malformed
-                    if enhanced_query and len(enhanced_query) > 3:
-                        logging.info(f"🔍 AI enhanced instruction-style query: '{enhanced_query}' (original: '{text}')")
-                        return enhanced_query
             else:
-                logging.info(f"🔍 Query doesn't meet criteria for enhancement. Has pronouns: {has_pronouns}, Is short query: {is_short_query}, Has instruction pattern: {has_instruction_pattern}")
+                logging.info(f"🔍 Query doesn't meet criteria for enhancement. Trigger: None, Is short query: {is_short_query}")
             
-            # Use DEFAULT_MODEL for consistency
-            logging.info(f"🔍 Using Web Search Determination Prompt to evaluate search need")
-            response = openai.chat.completions.create(
+            question = "Does this message require a web search to provide an accurate response? If yes, enhance the query. Respond with the JSON object only."
+        
+        # Determine search need and enhance the query in a single call
+        logging.info(f"🔍 Using combined Search Determination and Query Enhancement Prompt")
+        response = openai.chat.completions.create(
+            model=DEFAULT_MODEL,
+            messages=[
+                {
+                    "role": "system",
+                    "content": get_search_and_enhancement_combined_prompt(current_date)
+                },
+                {
+                    "role": "user",
+                    "content": f"{context}Message: {clean_text}\n\n{question}"
+                }
+            ],
+            temperature=0.1,
+            max_tokens=100,
+            response_format={"type": "json_object"}
+        )
+        
+        # Track token usage
+        if hasattr(response, 'usage'):
+            track_token_usage(
                 model=DEFAULT_MODEL,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": get_web_search_determination_prompt(current_date)
-                    },
-                    {
-                        "role": "user",
-                        "content": f"{context}Message: {clean_text}\n\nDoes this message require a web search to provide an accurate response? Answer with just 'Yes' or 'No'."
-                    }
-                ],
-                temperature=0.1,
-                max_tokens=5
+                prompt_tokens=response.usage.prompt_tokens,
+                completion_tokens=response.usage.completion_tokens,
+                purpose="search_detection"
             )
-            
-            # Track token usage
-            if hasattr(response, 'usage'):
-                track_token_usage(
-                    model=DEFAULT_MODEL,
-                    prompt_tokens=response.usage.prompt_tokens,
-                    completion_tokens=response.usage.completion_tokens,
-                    purpose="search_detection"
-                )
-            
-            result = response.choices[0].message.content.strip().lower()
-            logging.info(f"🔍 AI search detection result: {result}")
-            return result == "yes"
+        
+        result = json.loads(response.choices[0].message.content)
+        logging.info(f"🔍 AI search detection result: {result}")
+        
+        # The model occasionally answers with "true"/"false" strings instead of JSON booleans
+        is_search = result.get('is_search')
+        if isinstance(is_search, str):
+            is_search = is_search.strip().lower() == "true"
+        
+        if is_search is not True:
+            enhancement = False
+        else:
+            enhancement = _enhanced_query_result(str(result.get('enhanced_query') or ''), text)
+        
+        if enhance_with_context:
+            _cache_put(ENHANCEMENT_CACHE, enhancement_key, enhancement, ENHANCEMENT_CACHE_MAX)
+        return enhancement
     except Exception as e:
-        logging.error(f"❌ Error in AI search detection: {e}")
-        logging.error(traceback.format_exc())
+        logging.exception("❌ Error in AI search detection: %s", e)
         # Fall back to keyword detection
         return _keyword_search_detection(text)
 
@@ -686,11 +936,12 @@ def search_web(query, num_results=MAX_SEARCH_RESULTS, chat_guid=None):
     # Use the original query directly
     enhanced_query = query
     
-    if chat_guid and chat_guid in CONVERSATION_CONTEXT:
+    ctx = CONVERSATION_CONTEXT.get(chat_guid) if chat_guid else None
+    if ctx is not None:
         # Log the context for debugging
-        logging.info(f"🔍 Context tracking - Recent messages: {CONVERSATION_CONTEXT[chat_guid]['recent_messages']}")
-        logging.info(f"🔍 Context tracking - Detected entities: {CONVERSATION_CONTEXT[chat_guid]['entities']}")
-        logging.info(f"🔍 Context tracking - Topics: {CONVERSATION_CONTEXT[chat_guid]['topics']}")
+        logging.info("🔍 Context tracking - Recent messages: %s", ctx.recent_messages)
+        logging.info("🔍 Context tracking - Detected entities: %s", ctx.entities)
+        logging.info("🔍 Context tracking - Topics: %s", list(ctx.topics))
     
     # Build the search query
     search_query = {
@@ -705,13 +956,13 @@ def search_web(query, num_results=MAX_SEARCH_RESULTS, chat_guid=None):
     logging.info(f"🔍 Sending request to Google API: {GOOGLE_SEARCH_URL}")
     
     try:
-        response = requests.get(GOOGLE_SEARCH_URL, params=search_query)
+        response = _GOOGLE_SESSION.get(GOOGLE_SEARCH_URL, params=search_query, timeout=5)
         response.raise_for_status()
         
         logging.info(f"🔍 Google API response status code: {response.status_code}")
         
-        # Parse the response
-        results = response.json()
+        # Parse the response (orjson is noticeably faster on CSE payloads when installed)
+        results = orjson.loads(response.content) if orjson else response.json()
         
         # Check if we have results
         if 'items' not in results:
@@ -734,10 +985,12 @@ def search_web(query, num_results=MAX_SEARCH_RESULTS, chat_guid=None):
         
         return search_results
         
-    except requests.exceptions.RequestException as e:
+    except (requests.exceptions.RequestException, ValueError) as e:
+        # ValueError covers orjson decode errors, which are not RequestExceptions
         logging.error(f"❌ Error searching the web: {e}")
         return []
 
+@functools.lru_cache(maxsize=4096)
 def extract_domain(url):
     """
     Extract domain name from URL for cleaner source attribution
@@ -750,7 +1003,7 @@ def extract_domain(url):
     """
     try:
         if url:
-            match = re.search(r'https?://(?:www\.)?([^/]+)', url)
+            match = _DOMAIN_RE.search(url)
             if match:
                 return match.group(1)
     except:
@@ -763,7 +1016,7 @@ def extract_domain(url):
     max_tries=5,
     factor=2
 )
-def summarize_search_results(query, results, chat_guid=None, num_results=MAX_SEARCH_RESULTS):
+def summarize_search_results(query, results, chat_guid=None, num_results=MAX_SEARCH_RESULTS, cache=True):
     """
     Summarize search results using OpenAI with token optimization
     
@@ -772,6 +1025,8 @@ def summarize_search_results(query, results, chat_guid=None, num_results=MAX_SEA
         results (list): Search results
         chat_guid (str, optional): Chat GUID for context
         num_results (int, optional): Number of results to include in summary, defaults to MAX_SEARCH_RESULTS
+        cache (bool, optional): Reuse a recent summary for the same query and results when there is
+            no conversation context, defaults to True
         
     Returns:
         str: Summarized results
@@ -784,14 +1039,15 @@ def summarize_search_results(query, results, chat_guid=None, num_results=MAX_SEA
     if not results:
         return "I looked that up but couldn't find relevant information. Is there something else you'd like to know?"
     
+    ctx = CONVERSATION_CONTEXT.get(chat_guid) if chat_guid else None
+    
     # Get direct context from previous search if available
     if chat_guid and chat_guid in LAST_SEARCH:
         last_query = LAST_SEARCH[chat_guid].get('original_query')
         last_response = LAST_SEARCH[chat_guid].get('last_response')
         
         # Check for pronouns that might indicate a follow-up
-        pronouns = ["they", "them", "their", "it", "its", "this", "that", "these", "those"]
-        has_pronouns = any(pronoun in query.lower().split() for pronoun in pronouns)
+        has_pronouns = not _FOLLOW_UP_PRONOUNS.isdisjoint(query.lower().split())
         
         # Check if it's a short query (likely needs context)
         is_short = len(query.split()) <= 5
@@ -810,23 +1066,13 @@ Make sure your response addresses the specific intent of the current question wh
 """
             logging.info(f"🔍 Using conversation context for summarization")
     # If no direct context, try conversation context
-    elif chat_guid and chat_guid in CONVERSATION_CONTEXT:
-        recent_messages = CONVERSATION_CONTEXT[chat_guid]['recent_messages']
-        entities = CONVERSATION_CONTEXT[chat_guid]['entities']
-        topics = CONVERSATION_CONTEXT[chat_guid]['topics']
+    elif ctx is not None:
+        recent_messages = ctx.recent_messages
+        entities = ctx.entities
+        topics = ctx.topics
         
         # Check if there was a recent image analysis - expanded to include more product types
-        image_analysis_indicators = [
-            # Plants
-            "plant", "snake plant", "sansevieria", 
-            # General identification phrases
-            "looks like", "appears to be", "this is a", "that's a", "that is a",
-            # Colors (often indicate product descriptions)
-            "color", "purple", "blue", "red", "green", "yellow", "black", "white",
-            # Food and beverages
-            "can", "bottle", "drink", "soda", "flavor", "tasty", "dr pepper", "coca-cola", "pepsi"
-        ]
-        has_image_analysis = any(indicator in " ".join(recent_messages[-3:]).lower() for indicator in image_analysis_indicators)
+        has_image_analysis = bool(_IMAGE_ANALYSIS_INDICATOR_RE.search(" ".join(recent_messages[-3:])))
         
         # Extract object name from recent image analysis if available
         object_name = None
@@ -835,45 +1081,42 @@ Make sure your response addresses the specific intent of the current question wh
         
         if has_image_analysis:
             # First, look for specific plant types mentioned in recent messages
-            plant_types = ["snake plant", "sansevieria", "orchid", "succulent", "cactus", "fern", "monstera", "pothos", "philodendron"]
             for msg in recent_messages[-3:]:
-                for plant in plant_types:
-                    if plant in msg.lower():
-                        plant_type = plant
-                        logging.info(f"🔍 Found specific plant type in messages for search context: '{plant_type}'")
-                        break
-                if plant_type:
+                plant_match = _PLANT_TYPE_RE.search(msg)
+                if plant_match:
+                    plant_type = plant_match.group(0).lower()
+                    logging.info(f"🔍 Found specific plant type in messages for search context: '{plant_type}'")
                     break
             
             # Look for product names and descriptions (beverages, food items, etc.)
-            product_indicators = ["dr pepper", "coca-cola", "pepsi", "sprite", "fanta", "mountain dew", "blackberry", "zero sugar"]
             for msg in recent_messages[-3:]:
-                for product in product_indicators:
-                    if product in msg.lower():
-                        # If we find a product indicator, try to extract the full product name
-                        product_match = re.search(r"(?:(?:that|this)(?:'s| is)? (?:a|an)? )?([a-zA-Z\s]+ (?:dr pepper|coca-cola|pepsi|sprite|fanta|mountain dew|zero sugar)[a-zA-Z\s]*)", msg.lower())
-                        if product_match:
-                            product_name = product_match.group(1).strip()
-                        else:
-                            # If regex fails, just use the indicator we found
-                            product_name = product
-                        logging.info(f"🔍 Found product name in messages for search context: '{product_name}'")
-                        break
+                indicator_match = _PRODUCT_INDICATOR_RE.search(msg)
+                if indicator_match:
+                    # If we find a product indicator, try to extract the full product name
+                    product_match = _PRODUCT_NAME_RE.search(msg.lower())
+                    if product_match:
+                        product_name = product_match.group(1).strip()
+                    else:
+                        # If regex fails, just use the indicator we found
+                        product_name = indicator_match.group(0).lower()
+                    logging.info(f"🔍 Found product name in messages for search context: '{product_name}'")
                 if product_name:
                     break
             
             # If no specific plant type or product was found, try to extract the object name using patterns
             if not plant_type and not product_name:
                 for msg in recent_messages[-3:]:
+                    msg_lc = msg.lower()
+                    
                     # More comprehensive pattern to catch various object descriptions
-                    object_match = re.search(r"(?:that'?s|this is)(?: a| an)?(?: type of)? ([a-zA-Z\s]+?)(?:!|\.|,|\n|$| that| which| and)", msg.lower())
+                    object_match = _OBJECT_NAME_RE.search(msg_lc)
                     if object_match:
                         object_name = object_match.group(1).strip()
                         logging.info(f"🔍 Extracted object name from analysis for search context: '{object_name}'")
                         break
                     
                     # Try to extract color + object descriptions (e.g., "deep purple can")
-                    color_object_match = re.search(r"((?:[a-zA-Z]+\s)?(?:purple|blue|red|green|yellow|black|white)\s[a-zA-Z]+)", msg.lower())
+                    color_object_match = _COLOR_OBJECT_RE.search(msg_lc)
                     if color_object_match:
                         object_name = color_object_match.group(1).strip()
                         logging.info(f"🔍 Extracted color+object description from analysis: '{object_name}'")
@@ -903,6 +1146,9 @@ Make sure your response addresses the specific intent of the current question wh
 """
             logging.info(f"🔍 Using recent messages for context")
     
+    # Summaries are only cached without conversation context, so they can't leak between chats
+    use_summary_cache = cache and not context
+    
     # If no context was set, use a default context
     if not context:
         context = f"""SEARCH CONTEXT:
@@ -917,7 +1163,6 @@ Provide a helpful response based on the search results without any additional co
     system_message = SEARCH_SUMMARIZATION_PROMPT
     
     # Prepare search results text
-    search_results_text = ""
     is_fallback_data = False
     
     # Check if these are fallback results
@@ -925,23 +1170,22 @@ Provide a helpful response based on the search results without any additional co
         is_fallback_data = True
         logging.info(f"🔍 Using fallback data for search results")
     
+    # Build the search results text, logging each result for debugging when INFO is enabled
+    log_results = logging.getLogger().isEnabledFor(logging.INFO)
+    logging.info(f"🔍 Search results for query: '{query}'")
+    result_parts = []
     for i, result in enumerate(results[:num_results], 1):
         title = result.get('title', 'No title')
         snippet = result.get('snippet', 'No snippet available')
         url = result.get('link', 'No URL')
         domain = extract_domain(url)
         
-        search_results_text += f"[{i}] {title}\n"
-        search_results_text += f"URL: {url}\n"
-        search_results_text += f"Source: {domain}\n"
-        search_results_text += f"Snippet: {snippet}\n\n"
-    
-    # Log search results for debugging
-    logging.info(f"🔍 Search results for query: '{query}'")
-    for i, result in enumerate(results[:num_results], 1):
-        title = result.get('title', 'No title')
-        snippet = result.get('snippet', 'No snippet available')[:100] + "..." if len(result.get('snippet', '')) > 100 else result.get('snippet', 'No snippet available')
-        logging.info(f"🔍 Result {i}: {title} - {snippet}")
+        result_parts.append(f"[{i}] {title}\nURL: {url}\nSource: {domain}\nSnippet: {snippet}\n\n")
+        
+        if log_results:
+            log_snippet = snippet[:100] + "..." if len(snippet) > 100 else snippet
+            logging.info(f"🔍 Result {i}: {title} - {log_snippet}")
+    search_results_text = "".join(result_parts)
     
     # Prepare user message
     user_message = f"{context}SEARCH QUERY: {query}\n\nSEARCH RESULTS:\n\n{search_results_text}"
@@ -949,39 +1193,52 @@ Provide a helpful response based on the search results without any additional co
     if is_fallback_data:
         user_message += "\nNOTE: These results are from a fallback data source as the web search did not return relevant information. The information is current as of the AI's last update and should be verified for the most recent details.\n"
     
-    user_message += "\nBased on the search results above, provide a smart, quick, and concise response to the query. Use a casual, text-message style tone with 1-2 relevant emojis. Be brief but informative - aim for 2-4 short sentences when possible. Skip any greetings and get straight to the information. If the search results don't have enough information, let me know in a conversational way. If the user is asking for links or how to find something, include direct links formatted as [text](URL) to the most relevant websites."
-    
     # Prepare messages
     messages = [
         {"role": "system", "content": system_message},
         {"role": "user", "content": user_message}
     ]
     
-    # Make API call
-    response = openai.chat.completions.create(
-        model=DEFAULT_MODEL,  # Using DEFAULT_MODEL for consistency across the application
-        messages=messages,
-        temperature=0.3,  # Lower temperature for more factual responses
-        max_tokens=1000   # Increased token limit for more comprehensive answers
-    )
-    
-    # Track token usage
-    track_token_usage(
-        model=DEFAULT_MODEL,
-        prompt_tokens=response.usage.prompt_tokens,
-        completion_tokens=response.usage.completion_tokens,
-        purpose="search_summary"
-    )
-    
-    # Get the summary
-    summary = response.choices[0].message.content.strip()
+    # Check for a recent summary of the same query and results
+    summary = None
+    summary_key = None
+    if use_summary_cache:
+        results_hash = hashlib.sha256(json.dumps(results[:num_results], sort_keys=True).encode()).hexdigest()
+        summary_key = (_normalize_query(query), results_hash)
+        cached = _cache_get(SUMMARY_CACHE, summary_key)
+        if cached is not _CACHE_MISS and time.monotonic() - cached[0] < SUMMARY_CACHE_TTL:
+            summary = cached[1]
+            logging.info(f"🔍 Using cached search summary for: '{query}'")
+    
+    if summary is None:
+        # Make API call
+        response = openai.chat.completions.create(
+            model=DEFAULT_MODEL,  # Using DEFAULT_MODEL for consistency across the application
+            messages=messages,
+            temperature=0.3,  # Lower temperature for more factual responses
+            max_tokens=1000   # Increased token limit for more comprehensive answers
+        )
+        
+        # Track token usage
+        track_token_usage(
+            model=DEFAULT_MODEL,
+            prompt_tokens=response.usage.prompt_tokens,
+            completion_tokens=response.usage.completion_tokens,
+            purpose="search_summary"
+        )
+        
+        # Get the summary
+        summary = response.choices[0].message.content.strip()
+        
+        if summary_key is not None:
+            _cache_put(SUMMARY_CACHE, summary_key, (time.monotonic(), summary), SUMMARY_CACHE_MAX)
     
     # Store the search results for future context
     if chat_guid:
         LAST_SEARCH[chat_guid] = {
             'original_query': query,
             'last_response': summary,
-            'timestamp': datetime.now()
+            'timestamp': time.monotonic()
         }
         logging.info(f"🔍 Stored search summary for future context")
     
@@ -1012,8 +1269,7 @@ Provide a helpful response based on the search results without any additional co
             else:
                 logging.warning("⚠️ Could not add web search results to thread due to active runs")
     except Exception as e:
-        logging.error(f"❌ Error adding web search results to Assistant thread: {e}")
-        logging.error(traceback.format_exc())
+        logging.exception("❌ Error adding web search results to Assistant thread: %s", e)
     
     return summary
 
@@ -1030,34 +1286,12 @@ def is_weather_query(text):
     if not text:
         return False
         
-    # Weather-related keywords
-    weather_keywords = [
-        "weather", "temperature", "forecast", "rain", "snow", "storm", 
-        "sunny", "cloudy", "humidity", "wind", "precipitation", "cold", 
-        "hot", "warm", "chilly", "freezing", "degrees"
-    ]
-    
-    # Weather-related patterns
-    weather_patterns = [
-        r"(?i)weather\s+(in|for|at)\s+.+",
-        r"(?i)temperature\s+(in|at)\s+.+",
-        r"(?i)is\s+it\s+(raining|snowing|cold|hot|warm|sunny|cloudy)\s+(in|at)\s+.+",
-        r"(?i)what'?s\s+the\s+(weather|forecast|temperature)\s+(like|in|at|for)\s+.+",
-        r"(?i)how\s+(cold|hot|warm|chilly)\s+is\s+it\s+(in|at)\s+.+",
-        r"(?i)will\s+it\s+(rain|snow|be\s+cold|be\s+hot|be\s+sunny|be\s+cloudy)\s+(in|at|today|tomorrow|this\s+week)\s+.+"
-    ]
-    
     # Check for weather keywords
-    for keyword in weather_keywords:
-        if keyword.lower() in text.lower():
-            return True
+    if _WEATHER_KEYWORDS_RE.search(text):
+        return True
     
     # Check for weather patterns
-    for pattern in weather_patterns:
-        if re.search(pattern, text):
-            return True
-    
-    return False
+    return bool(_WEATHER_PATTERN_RE.search(text))
 
 def clean_search_cache():
     """
@@ -1065,18 +1299,14 @@ def clean_search_cache():
     """
     global SEARCH_CACHE
     
-    current_time = datetime.now()
-    expired_keys = []
-    
-    for key, cache_entry in SEARCH_CACHE.items():
-        cache_time = cache_entry['timestamp']
-        if current_time - cache_time > timedelta(seconds=SEARCH_CACHE_EXPIRY):
-            expired_keys.append(key)
+    cutoff = time.monotonic() - SEARCH_CACHE_EXPIRY
     
-    for key in expired_keys:
-        del SEARCH_CACHE[key]
+    # Rebuild the cache in one pass rather than deleting expired entries one by one
+    fresh_cache = {key: cache_entry for key, cache_entry in SEARCH_CACHE.items() if cache_entry['timestamp'] >= cutoff}
+    removed = len(SEARCH_CACHE) - len(fresh_cache)
+    SEARCH_CACHE = fresh_cache
     
-    logging.info(f"🧹 Cleaned {len(expired_keys)} expired entries from search cache")
+    logging.info(f"🧹 Cleaned {removed} expired entries from search cache")
 
 def needs_supplemental_web_search(ai_response, text_prompt):
     """
@@ -1090,23 +1320,9 @@ def needs_supplemental_web_search(ai_response, text_prompt):
         bool: True if supplemental search is needed
     """
     # Check for uncertainty indicators in the AI response
-    uncertainty_patterns = [
-        r"(?i)I don'?t have (the latest|current|up-to-date|real-time) information",
-        r"(?i)I don'?t have access to (the latest|current|up-to-date|real-time) information",
-        r"(?i)my (knowledge|information|data) (is limited to|only goes up to|cuts off at)",
-        r"(?i)I (can'?t|cannot|don'?t) (access|browse|search) the (internet|web)",
-        r"(?i)I (don'?t have|lack|cannot access) (current|real-time|live) data",
-        r"(?i)my training (data|cut-off|knowledge) (is|was) (in|from|before)",
-        r"(?i)I (don'?t|cannot|can'?t) provide (current|real-time|up-to-date) information",
-        r"(?i)for the most (current|up-to-date|recent) information",
-        r"(?i)you (may|might|should|could) (want to|need to) (check|verify|look up)",
-        r"(?i)I'?m not (able to|capable of) (searching|browsing|accessing) the (internet|web)"
-    ]
-    
-    for pattern in uncertainty_patterns:
-        if re.search(pattern, ai_response):
-            # If the AI expresses uncertainty, check if the prompt requires current information
-            return is_realtime_information_query(text_prompt)
+    if _UNCERTAINTY_RE.search(ai_response):
+        # If the AI expresses uncertainty, check if the prompt requires current information
+        return is_realtime_information_query(text_prompt)
     
     return False
 
@@ -1122,18 +1338,17 @@ def _is_likely_related(current_query, previous_query):
         bool: True if likely related
     """
     # Check for pronouns that might refer to entities in the previous query
-    pronouns = ["it", "they", "them", "these", "those", "this", "that", "their", "its"]
-    has_pronouns = any(pronoun in current_query.lower().split() for pronoun in pronouns)
+    query_lower = current_query.lower()
+    has_pronouns = not _FOLLOW_UP_PRONOUNS.isdisjoint(query_lower.split())
     
     # Check if the query is very short (likely needs context)
     is_short = len(current_query.split()) <= 5
     
     # Check if the query starts with common follow-up patterns
-    followup_starters = ["how", "what", "when", "where", "why", "who", "which", "is", "are", "do", "does", "can", "could"]
-    starts_with_followup = any(current_query.lower().startswith(starter) for starter in followup_starters)
+    starts_with_followup = query_lower.startswith(_FOLLOW_UP_STARTERS)
     
     # Extract potential entities from the previous query
-    previous_words = re.findall(r'\b[A-Z][a-z]+\b', previous_query)
+    previous_words = _CAPITALIZED_WORD_RE.findall(previous_query)
     
     # If we have pronouns or it's a short query starting with a follow-up word, it's likely related
     return has_pronouns or (is_short and starts_with_followup) or len(previous_words) > 0 
@@ -1159,12 +1374,12 @@ def interpret_follow_up_question(current_query, previous_query, previous_respons
     # Log that a follow-up question was detected
     logging.info(f"🔄 Follow-up question detected: '{current_query}'")
     
-    # Import re module explicitly to avoid UnboundLocalError
-    import re
+    # Lowercase the queries once for the checks below
+    current_query_lower = current_query.lower()
+    previous_query_lower = previous_query.lower()
     
     # Check if this is likely a follow-up question
-    pronouns = ["they", "them", "their", "it", "its", "this", "that", "these", "those"]
-    has_pronouns = any(pronoun in current_query.lower().split() for pronoun in pronouns)
+    has_pronouns = not _FOLLOW_UP_PRONOUNS.isdisjoint(current_query_lower.split())
     is_short = len(current_query.split()) <= 5
     
     if not (has_pronouns or is_short):
@@ -1172,23 +1387,14 @@ def interpret_follow_up_question(current_query, previous_query, previous_respons
         return current_query
     
     # Check if the previous query was an image analysis
-    is_image_analysis = "image analysis" in previous_query.lower()
-    
-    # Check for related topics in the conversation context
-    chat_guid = None
-    try:
-        for guid, context in CONVERSATION_CONTEXT.items():
-            if previous_query in context['recent_messages'] or any(previous_query in msg for msg in context['recent_messages']):
-                chat_guid = guid
-                break
-    except Exception as e:
-        logging.error(f"❌ Error finding chat context: {e}")
+    is_image_analysis = "image analysis" in previous_query_lower
     
     # If we have relevant topics from the conversation, use them to enhance the query
     if is_short or has_pronouns:
         try:
             # Format the prompt for AI
             current_date = get_current_date_formatted()
+            previous_answer = '' if previous_response is None else f"Previous answer: {previous_response}\n\n"
             
             # Use the AI to interpret the follow-up question in context
             response = openai.chat.completions.create(
@@ -1200,7 +1406,7 @@ def interpret_follow_up_question(current_query, previous_query, previous_respons
                     },
                     {
                         "role": "user",
-                        "content": f"DATE: {current_date}\n\nPrevious question: {previous_query}\n\n{'' if previous_response is None else 'Previous answer: ' + previous_response + '\n\n'}Follow-up question: {current_query}\n\nPlease interpret this follow-up question in the context of the previous question and answer. Return a specific, detailed query that captures the user's intent."
+                        "content": f"DATE: {current_date}\n\nPrevious question: {previous_query}\n\n{previous_answer}Follow-up question: {current_query}\n\nPlease interpret this follow-up question in the context of the previous question and answer. Return a specific, detailed query that captures the user's intent."
                     }
                 ],
                 temperature=0.3,
@@ -1220,15 +1426,15 @@ def interpret_follow_up_question(current_query, previous_query, previous_respons
             enhanced_query = response.choices[0].message.content.strip()
             
             # Clean up the response
-            enhanced_query = re.sub(r'^(query|search|search query|enhanced query|interpreted query)[:\-]?\s*', '', enhanced_query, flags=re.IGNORECASE)
-            enhanced_query = re.sub(r'^["\'](.*)["\']$', r'\1', enhanced_query)  # Remove quotes if present
+            enhanced_query = _INTERPRETED_QUERY_PREFIX_RE.sub('', enhanced_query)
+            if len(enhanced_query) >= 2 and enhanced_query[0] in '"\'' and enhanced_query[-1] in '"\'':
+                enhanced_query = enhanced_query[1:-1]  # Remove quotes if present
             
             logging.info(f"🔄 Interpreted follow-up question: '{enhanced_query}' (original: '{current_query}')")
             
             return enhanced_query
         except Exception as e:
-            logging.error(f"❌ Error interpreting follow-up question: {e}")
-            logging.error(traceback.format_exc())
+            logging.exception("❌ Error interpreting follow-up question: %s", e)
             # Return the original query if there's an error
             return current_query
     